@@ -6,6 +6,22 @@ import re
 import unicodedata
 from datetime import datetime as dt
 import pandas as pd
+import pyarrow as pa
+from pyarrow import csv as pa_csv
+from openpyxl import load_workbook
+
+# Streaming xlsx reader (python-calamine), far lighter than openpyxl's DOM parser.
+# openpyxl is still used for writing since calamine is read-only.
+EXCEL_ENGINE = 'calamine'
+# Bytes of CSV parsed and processed at a time, caps peak memory on large exports
+CSV_BLOCK_SIZE = 1 << 20
+# Columns the searching and updating processes read for each data type, files are parsed
+# with only these columns. Data types without an entry are read in full.
+USED_COLUMNS = {
+    'tsun': ['Name', 'Description', 'Finder URL', 'Founded', 'Employees', 'Funding Stage'],
+    'cb': ['Organization Name', 'Description', 'Full Description', 'Organization Name URL',
+           'Founded Date', 'CB Rank (Company)', 'Headquarters Location'],
+}
 
 
 def clean_value(value):
@@ -18,15 +34,98 @@ def clean_value(value):
     except ValueError:
         return cleaned_value
 
-def clean_dataframe(filepath, file_type='csv'):
-    """Reads a file into a DataFrame, cleans it, and returns the cleaned DataFrame."""
-    read_function = pd.read_csv if file_type == 'csv' else pd.read_excel
-    df = read_function(filepath, index_col=False,
-                   engine='openpyxl' if file_type == 'excel' else None)
+def clean_columns(df):
+    """Applies clean_value to every column of the DataFrame in place and returns it."""
     for col in df.columns:
         df[col] = df[col].apply(clean_value)
     return df
 
+def clean_dataframe(filepath, file_type='csv', usecols=None):
+    """Reads a file into a DataFrame, cleans it, and returns the cleaned DataFrame."""
+    read_function = pd.read_csv if file_type == 'csv' else pd.read_excel
+    df = read_function(filepath, index_col=False, usecols=usecols,
+                   engine=EXCEL_ENGINE if file_type == 'excel' else None)
+    return clean_columns(df)
+
+def read_header(filepath, file_type='csv'):
+    """Reads only the header row of a file and returns its column names."""
+    if file_type == 'csv':
+        return pd.read_csv(filepath, nrows=0).columns.tolist()
+    # calamine decodes the whole sheet even with nrows=0, openpyxl's read-only mode stops after the first row
+    workbook = load_workbook(filepath, read_only=True)
+    try:
+        header = next(workbook.worksheets[0].iter_rows(max_row=1, values_only=True), ())
+    finally:
+        workbook.close()
+    return list(header)
+
+def iter_clean_dataframe(filepath, file_type='csv', data_type=None, block_size=CSV_BLOCK_SIZE):
+    """Yields cleaned DataFrame chunks of a file. Excel files can't be chunked and come as one chunk.
+    When the data type is known only the columns listed in USED_COLUMNS are parsed."""
+    used_columns = USED_COLUMNS.get(data_type)
+    if file_type != 'csv':
+        usecols = (lambda col: col in used_columns) if used_columns else None
+        yield clean_dataframe(filepath, file_type, usecols=usecols)
+        return
+    # pyarrow's multithreaded parser, every column is read as text since clean_value does the conversion
+    read_options = pa_csv.ReadOptions(use_threads=True, block_size=block_size)
+    # Quoted cells such as Crunchbase's 'Full Description' can contain line breaks
+    parse_options = pa_csv.ParseOptions(newlines_in_values=True)
+    # Column names as pyarrow sees them, pandas renames blank and repeated headers
+    with pa_csv.open_csv(filepath, read_options=read_options, parse_options=parse_options) as reader:
+        columns = reader.schema.names
+    include_columns = None
+    if used_columns:
+        # Missing columns are left out rather than added empty, same as reading the full file.
+        # pyarrow reads a repeated header from its first occurrence, like pandas does.
+        include_columns = list(dict.fromkeys(col for col in columns if col in used_columns))
+    convert_options = pa_csv.ConvertOptions(
+        column_types={col: pa.string() for col in columns},
+        include_columns=include_columns,
+        strings_can_be_null=True)
+    with pa_csv.open_csv(filepath, read_options=read_options, parse_options=parse_options,
+                         convert_options=convert_options) as reader:
+        for batch in reader:
+            df = batch.to_pandas()
+            df.columns = unique_column_names(df.columns)
+            yield clean_columns(df)
+
+def unique_column_names(names):
+    """Renames blank and repeated column names the way pandas does, e.g. 'Unnamed: 6' and 'Description.1'."""
+    unique_names = []
+    for i, name in enumerate(names):
+        name = name or f"Unnamed: {i}"
+        count = 0
+        unique_name = name
+        while unique_name in unique_names:
+            count += 1
+            unique_name = f"{name}.{count}"
+        unique_names.append(unique_name)
+    return unique_names
+
+def validate_file_type(columns: list, data_type: str) -> bool:
+    """Validates if the file columns match the specified data type."""
+    required_columns = {
+        'tsun': ['Finder URL'],
+        'cb': ['CB Rank (Company)'],
+        'pb': ['PitchBook uniqe column'],  # Update with actual columns if known
+        'other': ['other format uniqe column']  # Update with actual columns if known
+    }
+    if data_type not in required_columns:
+        return False
+    return all(col in columns for col in required_columns[data_type])
+
+def write_table(df, path):
+    """Writes a DataFrame to an .xlsx or a .parquet file depending on the path extension."""
+    if path.lower().endswith('.xlsx'):
+        df.to_excel(path, index=False, engine='openpyxl')
+    elif path.lower().endswith('.parquet'):
+        # clean_value leaves int and str values mixed in a column, parquet needs one type per column
+        text_columns = {col: 'string' for col in df.columns if df[col].dtype == object}
+        df.astype(text_columns).to_parquet(path, index=False, engine='pyarrow')
+    else:
+        raise ValueError("File path must end with .xlsx or .parquet")
+
 def escape_special_characters(name: str) -> str:
     """Replaces special characters in a filename with underscores to ensure compatibility."""
     return re.sub(r'[^a-zA-Z0-9-_]', '_', name)
@@ -34,11 +133,21 @@ def escape_special_characters(name: str) -> str:
 class DbHandler:
     """Handles a data files from tsun, cb, pb and others"""
     def __init__(self, main_db_path, not_neurotech_path):
-        self.main_db = pd.read_excel(main_db_path)
-        self.not_neurotech_db = pd.read_excel(not_neurotech_path)
+        self.main_db = pd.read_excel(main_db_path, engine=EXCEL_ENGINE)
+        self.not_neurotech_db = pd.read_excel(not_neurotech_path, engine=EXCEL_ENGINE)
         self.df = pd.DataFrame()
         self.new_companies_db = pd.DataFrame(columns=self.main_db.columns.tolist())
         self.update_companies_db = pd.DataFrame(columns=self.main_db.columns.tolist())
+        # Rows found while processing are buffered here and appended in one concat by flush_pending
+        self.pending_rows = {"new": [], "update": []}
+        # Normalized names are computed once so each row is checked with a set lookup
+        # instead of normalizing the whole database again
+        self.main_db_names = (self.normalized_names(self.main_db['Company_Name'])
+                              | self.normalized_names(self.main_db.get('Former Company Names', pd.Series(dtype='float64'))))
+        self.not_neurotech_names = self.normalized_names(self.not_neurotech_db['Company_Name'])
+        self.db_names = {"new": set(), "update": set()}
+        # Exact company names in the update database, buffered or flushed, for the cb exact-name check
+        self.update_company_names = set()
 
     def normalize(self, name: str) -> str:
         """Normalzies a given name string"""
@@ -53,22 +162,33 @@ class DbHandler:
     def normalize_column_category(self, column_data):
         """Normalizes the names in a given column of the DataFrame."""
         return column_data.apply(lambda x: self.normalize(x) if isinstance(x, str) else '')
+
+    def normalized_names(self, column_data) -> set:
+        """Returns the set of normalized names in a given column of the DataFrame."""
+        return set(self.normalize_column_category(column_data))
     
     def is_company_in_main_db(self, company_name):
         """Checks if a company is already in the given database."""
-        normalized_name = self.normalize(company_name)
-        current_names = self.normalize_column_category(self.main_db['Company_Name'])
-        former_names = self.normalize_column_category(self.main_db.get('Former Company Names', pd.Series(dtype='float64')))
-        return any((current_names == normalized_name) | (former_names == normalized_name))   
+        return self.normalize(company_name) in self.main_db_names
     
     def is_company_in_db(self, company_name, db_name):
         """Checks if a company is already in the given database."""
-        normalized_name = self.normalize(company_name)
-        if db_name == "new":
-            current_names = self.normalize_column_category(self.new_companies_db['Company_Name'])
-        elif db_name == "update":
-            current_names = self.normalize_column_category(self.update_companies_db['Company_Name'])
-        return any(current_names == normalized_name)
+        return self.normalize(company_name) in self.db_names[db_name]
+
+    def add_pending_row(self, db_name, row: dict):
+        """Buffers a row for the new or update database until the next flush_pending."""
+        self.pending_rows[db_name].append(row)
+        self.db_names[db_name].add(self.normalize(row['Company_Name']))
+        if db_name == "update":
+            self.update_company_names.add(row['Company_Name'])
+
+    def flush_pending(self):
+        """Appends all buffered rows to their databases with a single concat per database."""
+        if self.pending_rows["new"]:
+            self.new_companies_db = pd.concat([self.new_companies_db, pd.DataFrame(self.pending_rows["new"])], ignore_index=True)
+        if self.pending_rows["update"]:
+            self.update_companies_db = pd.concat([self.update_companies_db, pd.DataFrame(self.pending_rows["update"])], ignore_index=True)
+        self.pending_rows = {"new": [], "update": []}
     
     def get_updating_date(self):
         """Adds the current date to the 'Updating_Date' column for new companies."""
@@ -82,38 +202,25 @@ class DbHandler:
             )
     
     def export_new(self, path):
-        """Exports new database to excel"""
-        if not path.lower().endswith('.xlsx'):
-            raise ValueError("File path must end with .xlsx")
+        """Exports new database to an Excel or a Parquet file"""
+        self.flush_pending()
         self.get_updating_date()
-        self.new_companies_db.to_excel(path, index=False, engine='openpyxl')
+        write_table(self.new_companies_db, path)
 
     def export_updates(self, path):
-        """Exports the updates database to an Excel file."""
-        if not path.lower().endswith('.xlsx'):
-            raise ValueError("File path must end with .xlsx")
-        self.update_companies_db.to_excel(path, index=False, engine='openpyxl')
+        """Exports the updates database to an Excel or a Parquet file."""
+        self.flush_pending()
+        write_table(self.update_companies_db, path)
 
     def clear_new_db(self):
         """Clears new database"""
+        self.pending_rows["new"] = []
+        self.db_names["new"] = set()
         self.new_companies_db = pd.DataFrame(columns=self.main_db.columns.tolist())
 
-    def validate_file_type(self, file_path: str, data_type: str) -> bool:
-        """Validates if the file content matches the specified data type."""
-        self.df = clean_dataframe(file_path)
-        required_columns = {
-            'tsun': ['Finder URL'],
-            'cb': ['CB Rank (Company)'],
-            'pb': ['PitchBook uniqe column'],  # Update with actual columns if known
-            'other': ['other format uniqe column']  # Update with actual columns if known
-        }
-        if data_type not in required_columns:
-            return False
-        return all(col in self.df.columns for col in required_columns[data_type])
-
-    def start_searching_process(self, file_path: str, data_type: str):
-        """Start the searching process of the algortheim"""
-        self.df = clean_dataframe(file_path)
+    def start_searching_process(self, df: pd.DataFrame, data_type: str):
+        """Start the searching process of the algortheim on an already cleaned DataFrame"""
+        self.df = df
         if data_type == 'tsun':
             self.find_new_companies_tsun()
         elif data_type == 'cb':
@@ -123,19 +230,37 @@ class DbHandler:
         else:
             self.find_new_companies_other()
 
-    def start_update_process(self, file_path: str, data_type: str):
-        """Start the updating process of the algortheim"""
-        self.df = clean_dataframe(file_path)
+    def start_update_process(self, df: pd.DataFrame, data_type: str):
+        """Start the updating process of the algortheim on an already cleaned DataFrame"""
+        self.df = df
         if data_type == 'tsun':
             self.update_current_companies_tsun()
         if data_type == 'cb':
             self.update_current_companies_cb()
 
+    def start_process_chunk(self, chunk: pd.DataFrame, data_type: str):
+        """Runs both the searching and the updating process on one chunk of a file"""
+        self.start_searching_process(chunk, data_type)
+        self.start_update_process(chunk, data_type)
+
+    def start_process_batch(self, files: list):
+        """Processes a batch of (file_path, file_type, data_type) files, appending the found rows once at the end"""
+        try:
+            for file_path, file_type, data_type in files:
+                for chunk in iter_clean_dataframe(file_path, file_type, data_type):
+                    self.start_process_chunk(chunk, data_type)
+        except Exception:
+            # Drop the rows of a failed batch so they don't leak into the next export
+            self.pending_rows = {"new": [], "update": []}
+            self.db_names = {"new": self.normalized_names(self.new_companies_db['Company_Name']),
+                             "update": self.normalized_names(self.update_companies_db['Company_Name'])}
+            self.update_company_names = set(self.update_companies_db['Company_Name'])
+            raise
+        self.flush_pending()
+
     def is_company_not_neurotech(self, company_name):
         """Checks if a company is listed in the not neurotech database."""
-        normalized_name = self.normalize(company_name)
-        current_names = self.normalize_column_category(self.not_neurotech_db['Company_Name'])
-        return any(current_names == normalized_name)
+        return self.normalize(company_name) in self.not_neurotech_names
 
     def find_new_companies_tsun(self):
         """Finds new companies from the Startup Nation Central data"""
@@ -150,15 +275,15 @@ class DbHandler:
             condition_2 = self.is_company_not_neurotech(company_name)
             condition_3 = self.is_company_in_db(company_name, db_name="new")
             if not condition_1 and not condition_2 and not condition_3:
-                new_entry = pd.Series({
+                new_entry = {
                     'Company_Name': company_name,
                     'Startup Nation Page': website,
                     'Company_Founded_Year': year_founded,
                     'Company_Number_of_Employees': employees,
                     'Funding_Status': funding_stage,
                     'Description': description
-                })
-                self.new_companies_db = pd.concat([self.new_companies_db, pd.DataFrame([new_entry])], ignore_index=True)
+                }
+                self.add_pending_row("new", new_entry)
 
     def find_new_companies_cb(self):
         """Findes new compnies from the crunchbase"""
@@ -183,7 +308,7 @@ class DbHandler:
                     'Full Description': full_description,
                     'Company_CB_Rank': cb_rank
                 }
-                self.new_companies_db = pd.concat([self.new_companies_db, pd.DataFrame([new_entry])], ignore_index=True)
+                self.add_pending_row("new", new_entry)
 
     def find_new_companies_pb(self):
         """Findes new compnies from pitchbook """
@@ -240,7 +365,7 @@ class DbHandler:
                     # If there are any differences, add the updated data to update_companies_db
                     if differences:
                         differences['Company_Name'] = company_name
-                        self.update_companies_db = pd.concat([self.update_companies_db, pd.DataFrame([differences])], ignore_index=True)
+                        self.add_pending_row("update", differences)
 
     def update_current_companies_cb(self):
         """Updates current companies from Crunchbase, ensuring no duplicates after tsun updates."""
@@ -251,37 +376,29 @@ class DbHandler:
             condition_1 = self.is_company_in_main_db(company_name)
             condition_3 = self.is_company_not_neurotech(company_name)
             if condition_1 and not condition_3:
-                # Look for an existing entry in the update_companies_db
-                existing_update = self.update_companies_db[self.update_companies_db['Company_Name'] == company_name]
+                if company_name in self.update_company_names:
+                    # Already in update_companies_db, buffered or flushed, so the result doesn't
+                    # depend on how the files were split into batches
+                    continue
+                main_db_entry = self.main_db[self.main_db['Company_Name'] == company_name]
+                if not main_db_entry.empty:
+                    main_db_entry = main_db_entry.iloc[0].to_dict()
+                else:
+                    # If the company is not found in main_db, skip to the next iteration
+                    continue
 
                 # Initialize a dictionary to store the differences
                 differences = {}
-                if not existing_update.empty:
-                    # Update existing entry if it exists
-                    differences = existing_update.iloc[0].to_dict()
-                else:
-                    main_db_entry = self.main_db[self.main_db['Company_Name'] == company_name]
-                    if not main_db_entry.empty:
-                        main_db_entry = main_db_entry.iloc[0].to_dict()
-                    else:
-                        # If the company is not found in main_db, skip to the next iteration
-                        continue
-
-                    # Update differences with new values if they differ
-                    if website and website != main_db_entry.get('CB (Crunchbase) Link'):
-                        differences['CB (Crunchbase) Link'] = website
-                    if cb_rank and cb_rank != main_db_entry.get('Company_CB_Rank'):
-                        differences['Company_CB_Rank'] = cb_rank
-
-                # If there are any differences, update or add the data in update_companies_db
+                # Update differences with new values if they differ
+                if website and website != main_db_entry.get('CB (Crunchbase) Link'):
+                    differences['CB (Crunchbase) Link'] = website
+                if cb_rank and cb_rank != main_db_entry.get('Company_CB_Rank'):
+                    differences['Company_CB_Rank'] = cb_rank
+
+                # If there are any differences, add the data to update_companies_db
                 if differences:
                     differences['Company_Name'] = company_name
-                    if not existing_update.empty:
-                        # Update the existing entry in update_companies_db
-                        self.update_companies_db.update(pd.DataFrame([differences]))
-                    else:
-                        # Add a new entry to update_companies_db
-                        self.update_companies_db = pd.concat([self.update_companies_db, pd.DataFrame([differences])], ignore_index=True)
+                    self.add_pending_row("update", differences)
 
     def update_current_compnies_pb(self):
         """Updates current compnies from pb"""
@@ -6,15 +6,17 @@ import os
 import base64
 import logging
 import csv
+import zipfile
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 import customtkinter as ctk
 from tkinterdnd2 import TkinterDnD, DND_FILES
-import pandas as pd
-from backend import DbHandler, escape_special_characters
 from dotenv import load_dotenv
 import requests
 import threading
+import functools
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
 
 # Load environment variables
 load_dotenv()
@@ -30,21 +32,42 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 
 # Constants
 FILE_TYPES = ["tsun", "cb", "pb", "other"]
-loading_files = []
-loaded_files = []
-db_handler = DbHandler(MAIN_DB_PATH, NOT_NEUROTECH_DB_PATH)
+# Characters of a CSV read to check that it looks like delimited text
+CSV_SNIFF_SIZE = 64 * 1024
+
+class EmptyFileError(ValueError):
+    """Raised when a file selected for loading has no content."""
+
+@dataclass(slots=True, eq=False)
+class LoadingFile:
+    """A file in the loading or loaded list, eq=False so entries are compared by identity."""
+    path: str
+    name: str
+    file_type: str
+    data_type: str = "tsun"
+    row_widgets: tuple | None = None  # Widgets of the row displaying the file
+
+loading_files: list[LoadingFile] = []
+loaded_files: list[LoadingFile] = []
+# Loading file whose data type is shown and edited by the shared type menu
+selected_file: LoadingFile | None = None
+# Created by get_db_handler, pandas and the databases are only loaded when first needed
+db_handler = None
+db_handler_lock = threading.Lock()
 lock = threading.Lock()
-
-# Initialize the root window with customtkinter style
-ctk.set_appearance_mode("System")
-ctk.set_default_color_theme("blue")
-
-root = TkinterDnD.Tk()
-root.title("File Upload GUI")
-root.geometry("600x600")
-
-folder_path = tk.StringVar()
-csv_path = tk.StringVar()
+# Runs uploads off the Tk main thread, one batch at a time since DbHandler is not thread safe
+load_executor = ThreadPoolExecutor(max_workers=1)
+
+# Root window, Tk variables and widgets used by the callbacks, all built by main()
+root = None
+folder_path = None
+csv_path = None
+final_upload_button = None
+export_new_companies_button = None
+export_updates_button = None
+type_menu = None
+loading_list_frame = None
+loaded_list_frame = None
 
 def upload_to_imgbb(image_path: str) -> str:
     """Uploads an image to ImgBB and returns the URL of the uploaded image."""
@@ -72,6 +95,7 @@ def upload_to_imgbb(image_path: str) -> str:
 
 def update_csv_with_url(csv_file: str, company_name: str, image_url: str):
     "Updates a CSV file by adding the image URL to the corresponding company."
+    from backend import escape_special_characters
     rows = []
     updated = False
     company_name = escape_special_characters(company_name)
@@ -94,74 +118,155 @@ def update_csv_with_url(csv_file: str, company_name: str, image_url: str):
         writer.writeheader()
         writer.writerows(rows)
 
-def process_file(filepath: str):
-    """Processes a file and updates the loading file list."""
+def get_db_handler():
+    """Returns the database handler, importing the backend and loading the databases on first use."""
+    global db_handler
+    with db_handler_lock:
+        if db_handler is None:
+            from backend import DbHandler
+            db_handler = DbHandler(MAIN_DB_PATH, NOT_NEUROTECH_DB_PATH)
+    return db_handler
+
+@functools.lru_cache(maxsize=256)
+def read_header_cached(file_path: str, mtime: float, file_type: str) -> tuple:
+    """Reads the header of a file once per modification time, editing the file invalidates the entry."""
+    from backend import read_header
+    return tuple(read_header(file_path, file_type))
+
+@functools.lru_cache(maxsize=256)
+def validate_file_cached(file_path: str, mtime: float, file_type: str, data_type: str) -> bool:
+    """Validates a file against a data type once per modification time of the file."""
+    from backend import validate_file_type
+    columns = read_header_cached(file_path, mtime, file_type)
+    return validate_file_type(columns, data_type)
+
+def probe_file(filepath: str):
+    """Checks that a file looks readable without parsing it and returns its file type,
+    None if the format is unsupported. The file is only parsed in load_all_files."""
+    if filepath.endswith('.csv'):
+        with open(filepath, 'r', newline='', encoding='utf-8') as file:
+            sample = file.read(CSV_SNIFF_SIZE)
+        if not sample.strip():
+            raise EmptyFileError(filepath)
+        try:
+            csv.Sniffer().sniff(sample, delimiters=',;\t')
+        except csv.Error:
+            # A single-column CSV has no delimiter for the sniffer to find
+            if any(delimiter in sample for delimiter in ',;\t'):
+                raise
+        return 'csv'
+    if filepath.endswith('.xlsx'):
+        if os.path.getsize(filepath) == 0:
+            raise EmptyFileError(filepath)
+        # Only the zip central directory is read, no sheet is parsed
+        with zipfile.ZipFile(filepath) as archive:
+            if 'xl/workbook.xml' not in archive.namelist():
+                raise zipfile.BadZipFile(f"No workbook in {filepath}")
+        return 'excel'
+    return None
+
+def process_files(filepaths):
+    """Probes the files in parallel and adds the readable ones to the loading file list."""
+    if not filepaths:
+        return
+    with ThreadPoolExecutor(max_workers=min(8, len(filepaths))) as executor:
+        probes = [(filepath, executor.submit(probe_file, filepath)) for filepath in filepaths]
+    # Errors are reported and rows added on the Tk thread, in the order the files were given
+    for filepath, probe in probes:
+        process_probe(filepath, probe)
+
+def process_probe(filepath: str, probe):
+    """Adds a probed file to the loading file list or reports why it can't be loaded."""
     try:
-        if filepath.endswith('.csv'):
-            pd.read_csv(filepath)  # Check if the CSV file can be read
-        elif filepath.endswith('.xlsx'):
-            pd.read_excel(filepath)  # Check if the Excel file can be read
-        else:
+        file_type = probe.result()
+        if file_type is None:
             messagebox.showerror("Error", "Unsupported file format.")
             return
-        
-        loading_files.append({"path": filepath, "data_type": tk.StringVar(value="tsun")})
-        refresh_loading_file_list()
+
+        file_info = LoadingFile(filepath, os.path.basename(filepath), file_type)
+        loading_files.append(file_info)
+        add_loading_row(file_info)
     except FileNotFoundError:
         logging.error("File not found: %s", filepath)
         messagebox.showerror("Error", f"File not found: {filepath}")
-    except pd.errors.EmptyDataError:
+    except EmptyFileError:
         logging.error("The file is empty: %s", filepath)
         messagebox.showerror("Error", f"The file is empty: {filepath}")
-    except pd.errors.ParserError:
+    except (csv.Error, zipfile.BadZipFile, UnicodeDecodeError):
         logging.error("Parsing error in file: %s", filepath)
         messagebox.showerror("Error", f"Parsing error in file: {filepath}")
     except PermissionError:
         logging.error("Permission denied: %s", filepath)
         messagebox.showerror("Error", f"Permission denied: {filepath}")
 
-def refresh_loading_file_list():
-    """Updates the displayed list of loading files."""
-    for widget in loading_list_frame.winfo_children():
+def add_loading_row(file_info: LoadingFile):
+    """Adds the row of a new loading file below the displayed rows."""
+    i = len(loading_files) - 1
+
+    file_label = ttk.Label(loading_list_frame, text=file_info.name)
+    file_label.grid(row=i, column=0, padx=5, pady=5)
+
+    # A plain label, the type is changed through the shared type_menu after clicking the row
+    type_label = ttk.Label(loading_list_frame, text=file_info.data_type)
+    type_label.grid(row=i, column=1, padx=5, pady=5)
+    for label in (file_label, type_label):
+        label.bind("<Button-1>", lambda event, info=file_info: select_loading_file(info))
+
+    delete_button = ttk.Button(loading_list_frame, text="Delete")
+    # The button looks its file up on click, so it stays valid when rows above it are deleted
+    delete_button.file_info = file_info
+    delete_button.configure(command=lambda b=delete_button: delete_file_from_loading_list(b.file_info))
+    delete_button.grid(row=i, column=2, padx=5, pady=5)
+    file_info.row_widgets = (file_label, type_label, delete_button)
+
+def select_loading_file(file_info: LoadingFile):
+    """Selects a loading file so the shared type menu shows and edits its data type."""
+    global selected_file
+    if selected_file is not None:
+        selected_file.row_widgets[0].configure(foreground="")
+    selected_file = file_info
+    file_info.row_widgets[0].configure(foreground="blue")
+    type_menu.configure(state="normal")
+    type_menu.set(file_info.data_type)
+
+def set_selected_data_type(data_type: str):
+    """Sets the data type of the selected loading file from the shared type menu."""
+    if selected_file is None:
+        return
+    selected_file.data_type = data_type
+    selected_file.row_widgets[1].configure(text=data_type)
+
+def remove_loading_row(file_info: LoadingFile, index: int):
+    """Destroys the row of a file removed from loading_files at index and moves the rows below it up."""
+    global selected_file
+    if file_info is selected_file:
+        selected_file = None
+        type_menu.configure(state="disabled")
+    for widget in file_info.row_widgets:
         widget.destroy()
+    file_info.row_widgets = None
+    for i, info in enumerate(loading_files[index:], start=index):
+        for column, widget in enumerate(info.row_widgets):
+            widget.grid(row=i, column=column, padx=5, pady=5)
 
-    for i, file_info in enumerate(loading_files):
-        file_path = file_info["path"]
-        file_type_var = file_info["data_type"]
-
-        file_label = ttk.Label(loading_list_frame, text=file_path.split('/')[-1])
-        file_label.grid(row=i, column=0, padx=5, pady=5)
-
-        type_menu = ttk.OptionMenu(loading_list_frame,
-                                file_type_var, file_type_var.get(),
-                                *FILE_TYPES)
-        type_menu.grid(row=i, column=1, padx=5, pady=5)
-
-        delete_button = ttk.Button(loading_list_frame,
-                                    text="Delete",
-                                    command=lambda idx=i: delete_file_from_loading_list(idx))
-        delete_button.grid(row=i, column=2, padx=5, pady=5)
-
-def delete_file_from_loading_list(index: int):
+def delete_file_from_loading_list(file_info: LoadingFile):
     """Deletes a file from the loading file list."""
     with lock:
+        index = loading_files.index(file_info)
         del loading_files[index]
-    refresh_loading_file_list()
+    remove_loading_row(file_info, index)
 
 def open_file_dialog():
     """Opens a file dialog to select multiple files for uploading."""
     filepaths = filedialog.askopenfilenames(filetypes=[("CSV files", "*.csv"),
                                                        ("Excel files", "*.xlsx")])
-    if filepaths:
-        for filepath in filepaths:
-            process_file(filepath)
+    process_files(filepaths)
 
 def drop(event: any):
     """Handles file drop events, allowing multiple files."""
-    filepaths = event.data.strip('{}').split('} {')
-    for filepath in filepaths:
-        filepath = os.path.normpath(filepath)  # Correct the path format for consistency
-        process_file(filepath)
+    # splitlist undoes TkDnD's brace quoting of paths with spaces, normpath corrects the path format
+    filepaths = [os.path.normpath(filepath) for filepath in root.tk.splitlist(event.data)]
+    process_files(filepaths)
 
 def load_all_files():
     """ Validates and uploads all files in the loading list."""
@@ -172,49 +277,106 @@ def load_all_files():
     valid_files = []
     with lock:
         for file_info in loading_files:
-            data_type = file_info['data_type'].get()
-            file_path = file_info['path']
-            if not db_handler.validate_file_type(file_path, data_type):
+            data_type = file_info.data_type
+            file_path = file_info.path
+            try:
+                is_valid = validate_file_cached(file_path, os.path.getmtime(file_path),
+                                                file_info.file_type, data_type)
+            except OSError as e:
+                logging.error("Failed to read %s: %s", file_path, e)
+                messagebox.showerror("Error", f"Failed to read file '{file_info.name}': {e}")
+                continue
+            except Exception as e:  # pandas, pyarrow and calamine each raise their own parsing errors
+                # probe_file only checks the zip directory or sniffs the CSV, this is the first real parse
+                logging.error("Parsing error in file: %s: %s", file_path, e)
+                messagebox.showerror("Error", f"Parsing error in file: {file_path}")
+                continue
+            if not is_valid:
                 messagebox.showerror("Error",
-                                    f"File '{file_path.split('/')[-1]}' does not match the specified type '{data_type}'. Please try again.")
+                                    f"File '{file_info.name}' does not match the specified type '{data_type}'. Please try again.")
             else:
                 valid_files.append(file_info)
+        # LoadingFile hashes by identity, a deleted entry's id can't be mistaken for a new file's
+        submitted = set(loading_files)
     if not valid_files:
         return
-    
+
+    batch = [(file_info.path, file_info.file_type, file_info.data_type)
+             for file_info in valid_files]
+    set_db_buttons_state("disabled")
+    future = load_executor.submit(process_batch, batch)
+    root.after(100, poll_load_future, future, valid_files, submitted)
+
+def process_batch(batch: list):
+    """Processes a batch on the upload worker, the databases are loaded there if they aren't yet."""
+    try:
+        handler = get_db_handler()
+    except Exception as e:
+        # Reported once for the batch, not blamed on the user's files
+        raise RuntimeError(f"Could not load the databases: {e}") from e
+    handler.start_process_batch(batch)
+
+def poll_load_future(future, valid_files, submitted):
+    """Checks the background upload from the Tk event loop and updates the lists once it's done."""
+    if not future.done():
+        root.after(100, poll_load_future, future, valid_files, submitted)
+        return
+    set_db_buttons_state("normal")
+    error = future.exception()
+    if error:
+        logging.error("Failed to load files: %s", error)
+        messagebox.showerror("Error", f"Failed to load files: {error}")
+        return
+    # Files added while the upload was running stay in the loading list
+    with lock:
+        for index in reversed(range(len(loading_files))):
+            if loading_files[index] in submitted:
+                remove_loading_row(loading_files.pop(index), index)
+
     for file_info in valid_files:
-        db_handler.start_searching_process(file_info['path'], file_info['data_type'].get())
-        db_handler.start_update_process(file_info['path'], file_info['data_type'].get())
         loaded_files.append(file_info)
-
-    loading_files.clear()
-    refresh_loading_file_list()
-    refresh_loaded_file_list()
+        add_loaded_row(file_info)
     messagebox.showinfo("Success", "All valid files uploaded successfully!")
 
+def poll_db_load_future(future):
+    """Checks the background database load from the Tk event loop and reports it if it failed."""
+    if not future.done():
+        root.after(100, poll_db_load_future, future)
+        return
+    # A running upload re-enables the buttons itself when it finishes
+    if final_upload_button.cget("state") != "disabled":
+        set_db_buttons_state("normal")
+    error = future.exception()
+    if error:
+        logging.error("Failed to load the databases: %s", error)
+        messagebox.showerror("Error", f"Failed to load the databases: {error}")
+
+def set_db_buttons_state(state: str):
+    """Enables or disables the buttons that use the database handler.
+    The export buttons stay disabled until the databases are loaded, so they never load them on the Tk thread."""
+    final_upload_button.configure(state=state)
+    export_state = state if db_handler is not None else "disabled"
+    for button in (export_new_companies_button, export_updates_button):
+        button.configure(state=export_state)
+
 def export_loaded_files():
-    """Exports the loaded files to an Excel file."""
+    """Exports the new companies found in the loaded files to an Excel or a Parquet file."""
     if not loaded_files:
         messagebox.showerror("Error", "No files to export.")
         return
-    db_handler.export_new(NEW_COMPANIES_PATH)
-    messagebox.showinfo("Success", "All files exported successfully!")
+    get_db_handler().export_new(NEW_COMPANIES_PATH)
+    messagebox.showinfo("Success", f"New companies exported successfully to {NEW_COMPANIES_PATH}!")
 
 def export_updated_file():
-    """Exports an Excel file of companies that need to be updated."""
-    db_handler.export_updates(UPDATED_COMPANIES_PATH)
-    messagebox.showinfo("Success", "Updated companies exported successfully!")
+    """Exports the companies that need to be updated to an Excel or a Parquet file."""
+    get_db_handler().export_updates(UPDATED_COMPANIES_PATH)
+    messagebox.showinfo("Success", f"Updated companies exported successfully to {UPDATED_COMPANIES_PATH}!")
 
-def refresh_loaded_file_list():
-    """Updates the displayed list of loaded files."""
-    for widget in loaded_list_frame.winfo_children():
-        widget.destroy()
-
-    for i, file_info in enumerate(loaded_files):
-        file_path = file_info["path"]
-
-        file_label = ttk.Label(loaded_list_frame, text=file_path.split('/')[-1])
-        file_label.grid(row=i, column=0, padx=5, pady=5)
+def add_loaded_row(file_info: LoadingFile):
+    """Adds the row of a newly loaded file below the displayed rows."""
+    file_label = ttk.Label(loaded_list_frame, text=file_info.name)
+    file_label.grid(row=len(loaded_files) - 1, column=0, padx=5, pady=5)
+    file_info.row_widgets = (file_label,)
 
 def upload_images_and_update_csv():
     """Opens the upload image GUI"""
@@ -246,71 +408,99 @@ def process_image_folder(image_folder_path, csv_file):
     else:
         messagebox.showinfo("Success", "Process completed successfully!")
 
-# Main header
-header = ctk.CTkLabel(root, text="Upload Files",
-                       font=("Arial", 16),
-                         fg_color="green",
-                           text_color="white",
-                             anchor="center")
-header.pack(fill="x", pady=10)
-
-# Img uploader
-img_button = ctk.CTkButton(root,
-                            text="Upload Images",
-                            command=upload_images_and_update_csv)
-img_button.pack(pady=10)
-
-# Folder and CSV selection for image upload
-folder_button = ctk.CTkButton(root,
-                               text="Select Image Folder",
-                                 command=lambda: folder_path.set(filedialog.askdirectory()))
-folder_button.pack(pady=10)
-
-csv_button = ctk.CTkButton(root,
-                            text="Select CSV File",
-                              command=lambda: csv_path.set(filedialog.askopenfilename(filetypes=[("CSV files", "*.csv")])))
-csv_button.pack(pady=10)
-
-# Drag and drop frame
-drag_frame = ctk.CTkFrame(root, width=400, height=200, corner_radius=10)
-drag_frame.pack(pady=20)
-drag_frame.pack_propagate(False)
-
-upload_button = ctk.CTkButton(drag_frame,
-                               text="Upload File or Drag files here",
-                                 command=open_file_dialog)
-upload_button.pack(pady=10)
-
-# Button frame
-button_frame = ctk.CTkFrame(root, width=600, height=100, corner_radius=10)
-button_frame.pack(pady=20)
-button_frame.pack_propagate(False)
-
-final_upload_button = ctk.CTkButton(button_frame, text="Load All Files", command=load_all_files)
-final_upload_button.pack(pady=5)
-
-export_new_companies_button = ctk.CTkButton(button_frame, text="Export New Companies", command=export_loaded_files)
-export_new_companies_button.pack(pady=5)
-
-export_updates_button = ctk.CTkButton(button_frame, text="Export Updated Companies", command=export_updated_file)
-export_updates_button.pack(pady=5)
-
-
-# Section for files ready to load
-loading_label = ctk.CTkLabel(root, text="Files ready to Load:", anchor="w")
-loading_label.pack(anchor="w", padx=20)
-
-loading_list_frame = ctk.CTkFrame(root)
-loading_list_frame.pack(pady=10, padx=20, fill="both", expand=True)
-
-# Section for files already loaded
-loaded_label = ctk.CTkLabel(root, text="Files Already Loaded:", anchor="w")
-loaded_label.pack(anchor="w", padx=20)
-
-loaded_list_frame = ctk.CTkFrame(root)
-loaded_list_frame.pack(pady=10, padx=20, fill="both", expand=True)
-
-drag_frame.drop_target_register(DND_FILES)
-drag_frame.dnd_bind('<<Drop>>', drop)
-
-root.mainloop()
\ No newline at end of file
+def main():
+    """Builds the GUI, starts loading the databases in the background and runs the Tk main loop."""
+    global root, folder_path, csv_path, final_upload_button, export_new_companies_button, \
+        export_updates_button, type_menu, loading_list_frame, loaded_list_frame
+    # Initialize the root window with customtkinter style
+    ctk.set_appearance_mode("System")
+    ctk.set_default_color_theme("blue")
+
+    root = TkinterDnD.Tk()
+    root.title("File Upload GUI")
+    root.geometry("600x600")
+
+    folder_path = tk.StringVar()
+    csv_path = tk.StringVar()
+
+    # Main header
+    header = ctk.CTkLabel(root, text="Upload Files",
+                           font=("Arial", 16),
+                             fg_color="green",
+                               text_color="white",
+                                 anchor="center")
+    header.pack(fill="x", pady=10)
+
+    # Img uploader
+    img_button = ctk.CTkButton(root,
+                                text="Upload Images",
+                                command=upload_images_and_update_csv)
+    img_button.pack(pady=10)
+
+    # Folder and CSV selection for image upload
+    folder_button = ctk.CTkButton(root,
+                                   text="Select Image Folder",
+                                     command=lambda: folder_path.set(filedialog.askdirectory()))
+    folder_button.pack(pady=10)
+
+    csv_button = ctk.CTkButton(root,
+                                text="Select CSV File",
+                                  command=lambda: csv_path.set(filedialog.askopenfilename(filetypes=[("CSV files", "*.csv")])))
+    csv_button.pack(pady=10)
+
+    # Drag and drop frame
+    drag_frame = ctk.CTkFrame(root, width=400, height=200, corner_radius=10)
+    drag_frame.pack(pady=20)
+    drag_frame.pack_propagate(False)
+
+    upload_button = ctk.CTkButton(drag_frame,
+                                   text="Upload File or Drag files here",
+                                     command=open_file_dialog)
+    upload_button.pack(pady=10)
+
+    # Button frame
+    button_frame = ctk.CTkFrame(root, width=600, height=100, corner_radius=10)
+    button_frame.pack(pady=20)
+    button_frame.pack_propagate(False)
+
+    final_upload_button = ctk.CTkButton(button_frame, text="Load All Files", command=load_all_files)
+    final_upload_button.pack(pady=5)
+
+    export_new_companies_button = ctk.CTkButton(button_frame, text="Export New Companies", command=export_loaded_files)
+    export_new_companies_button.pack(pady=5)
+
+    export_updates_button = ctk.CTkButton(button_frame, text="Export Updated Companies", command=export_updated_file)
+    export_updates_button.pack(pady=5)
+
+
+    # Section for files ready to load
+    loading_label = ctk.CTkLabel(root, text="Files ready to Load:", anchor="w")
+    loading_label.pack(anchor="w", padx=20)
+
+    # One type menu shared by all rows, it edits the file selected by clicking its row
+    type_menu = ctk.CTkOptionMenu(root, values=FILE_TYPES, command=set_selected_data_type, state="disabled")
+    type_menu.pack(anchor="w", padx=20)
+
+    loading_list_frame = ctk.CTkFrame(root)
+    loading_list_frame.pack(pady=10, padx=20, fill="both", expand=True)
+
+    # Section for files already loaded
+    loaded_label = ctk.CTkLabel(root, text="Files Already Loaded:", anchor="w")
+    loaded_label.pack(anchor="w", padx=20)
+
+    loaded_list_frame = ctk.CTkFrame(root)
+    loaded_list_frame.pack(pady=10, padx=20, fill="both", expand=True)
+
+    drag_frame.drop_target_register(DND_FILES)
+    drag_frame.dnd_bind('<<Drop>>', drop)
+
+    # Load the databases in the background so the window shows up right away,
+    # the export buttons are disabled until the load is done
+    set_db_buttons_state("normal")
+    db_load_future = load_executor.submit(get_db_handler)
+    root.after(100, poll_db_load_future, db_load_future)
+
+    root.mainloop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Tests for the file reading helpers of the backend module.
+"""
+
+import csv
+import pytest
+
+pd = pytest.importorskip("pandas")
+pytest.importorskip("pyarrow")
+
+from backend import CSV_BLOCK_SIZE, iter_clean_dataframe
+
+
+def test_iter_clean_dataframe_reads_multiline_cells_across_blocks(tmp_path):
+    """Quoted cells with line breaks must not break the chunked CSV reader on files larger than a block."""
+    path = tmp_path / "cb.csv"
+    header = ['Organization Name', 'Description', 'Full Description', 'Organization Name URL',
+              'Founded Date', 'CB Rank (Company)', 'Headquarters Location']
+    rows = 20_000
+    with open(path, 'w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        writer.writerow(header)
+        for i in range(rows):
+            writer.writerow([f"Company {i}", "Neurotech", f"First line {i}\n" + "x" * 300 + "\nLast line",
+                             f"https://example.com/{i}", "2020", i, "Tel Aviv"])
+    assert path.stat().st_size > CSV_BLOCK_SIZE
+
+    chunks = list(iter_clean_dataframe(str(path), 'csv', 'cb'))
+    assert sum(len(chunk) for chunk in chunks) == rows
+    assert chunks[0]['Full Description'].iloc[0].endswith("\nLast line")
+
+def make_handler(tmp_path):
+    """Creates a DbHandler over a small main database and an empty not neurotech database."""
+    from backend import DbHandler
+    main_db_path = tmp_path / "main_db.xlsx"
+    not_neurotech_path = tmp_path / "not_neurotech.xlsx"
+    pd.DataFrame({
+        'Company_Name': ['Acme', 'Beta Corp'],
+        'Startup Nation Page': ['old-acme', 'old-beta'],
+        'Company_Number_of_Employees': ['1-10', '1-10'],
+        'Funding_Status': ['Seed', 'Seed'],
+        'CB (Crunchbase) Link': ['old-acme-cb', 'old-beta-cb'],
+        'Company_CB_Rank': [1, 2],
+    }).to_excel(main_db_path, index=False)
+    pd.DataFrame({'Company_Name': []}).to_excel(not_neurotech_path, index=False)
+    return DbHandler(str(main_db_path), str(not_neurotech_path))
+
+def test_update_results_do_not_depend_on_batching(tmp_path):
+    """A tsun and a cb file give the same update table loaded together or in two batches."""
+    tsun_path = tmp_path / "tsun.csv"
+    tsun_path.write_text("Name,Description,Finder URL,Founded,Employees,Funding Stage\n"
+                         "Acme,d,new-acme,2020,11-50,Seed\n"
+                         "Beta Corp,d,new-beta,2020,11-50,Seed\n", encoding='utf-8')
+    cb_path = tmp_path / "cb.csv"
+    cb_path.write_text("Organization Name,Description,Full Description,Organization Name URL,"
+                       "Founded Date,CB Rank (Company),Headquarters Location\n"
+                       "Acme,d,f,new-acme-cb,2020,5,Tel Aviv\n"
+                       "Beta Corp,d,f,new-beta-cb,2020,6,Haifa\n", encoding='utf-8')
+    files = [(str(tsun_path), 'csv', 'tsun'), (str(cb_path), 'csv', 'cb')]
+
+    one_batch = make_handler(tmp_path)
+    one_batch.start_process_batch(files)
+    two_batches = make_handler(tmp_path)
+    two_batches.start_process_batch(files[:1])
+    two_batches.start_process_batch(files[1:])
+
+    # concat infers dtypes per batch, only the values have to match
+    pd.testing.assert_frame_equal(one_batch.update_companies_db, two_batches.update_companies_db,
+                                  check_dtype=False)
+    assert list(two_batches.update_companies_db['Company_Name']) == ['Acme', 'Beta Corp']
+
+@pytest.mark.parametrize("data_type", [None, 'other', 'cb'])
+def test_iter_clean_dataframe_reads_blank_and_repeated_headers(tmp_path, data_type):
+    """A trailing comma in the header and a repeated header are read like pandas reads them."""
+    path = tmp_path / "cb.csv"
+    path.write_text("Organization Name,Description,Description,CB Rank (Company),\n"
+                    "Acme,first,second,5,\n", encoding='utf-8')
+
+    df = pd.concat(list(iter_clean_dataframe(str(path), 'csv', data_type)), ignore_index=True)
+    assert df['Organization Name'].tolist() == ['Acme']
+    assert df['Description'].tolist() == ['first']
+    assert df['CB Rank (Company)'].tolist() == [5]
+    if data_type != 'cb':
+        assert df.columns.tolist() == ['Organization Name', 'Description', 'Description.1',
+                                       'CB Rank (Company)', 'Unnamed: 4']
+
+def test_read_header_reads_first_row_of_excel(tmp_path):
+    """The Excel header comes from the first row of the first sheet."""
+    from backend import read_header
+    path = tmp_path / "tsun.xlsx"
+    pd.DataFrame({'Name': ['Acme', 'Beta Corp'], 'Finder URL': ['a', 'b']}).to_excel(path, index=False)
+    assert read_header(str(path), 'excel') == ['Name', 'Finder URL']